@@ -4,21 +4,63 @@
 """
 import os
 import re
-import pandas as pd
-import pdfplumber
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
+import sys
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain
+import pymupdf
+import xlsxwriter
 import math
 
 # Константы для расчета массы труб по ГОСТ 18599-2001
 # Плотность полиэтилена ПЭ100 = 0.96 г/см³
 PE_DENSITY = 0.96  # г/см³
 
+logger = logging.getLogger(__name__)
 
+# Параметры трубы: SDR формат (160 х9,50) и ∅ формат (∅160х23,7) одним паттерном.
+# Префикс ∅/Ø не нужен: поиск и так находит число сразу после него
+_PIPE_PARAMS_RE = re.compile(r'(\d+)\s*[хx×]\s*(\d+[,.]?\d*)')
+# Число в ячейке количества
+_QTY_RE = re.compile(r'(\d+[.,]?\d*)')
+# Классификация номенклатуры (для classify_nomenclature): трубы и трубы + фитинги (только указанные)
+_PIPE_RE = re.compile(r'труба|футляр', re.IGNORECASE)
+# Группа 1 срабатывает на трубу, остальные варианты - фитинги
+_PIPE_OR_FITTING_RE = re.compile(r'(труба|футляр)|муфта|отвод|втулка|фланец', re.IGNORECASE)
+
+# Признаки столбцов в заголовке таблицы: (подстроки, столбец).
+# Подстроки ищутся в заголовке без пробелов, переносов и дефисов в нижнем регистре,
+# срабатывает первое правило, все подстроки которого найдены
+_HEADER_TAGS = (
+    (('наименование', 'техническ'), 'name'),
+    (('коли',), 'qty'),
+    (('оли', 'ство'), 'qty'),  # "Коли-\nчество" бывает разорвано соседним столбцом
+    (('завод',), 'manufacturer'),
+    (('изготовитель',), 'manufacturer'),
+)
+# Признаки объединенного столбца "Единица измерения / Количество"
+_UNIT_MARKERS = ('единиц', 'измер')
+# Удаление пробелов, переносов и дефисов из заголовка за один проход
+_HEADER_STRIP_TABLE = str.maketrans('', '', ' \n-')
+
+# Оформление Excel: свойства форматов xlsxwriter (из них собираются форматы книги)
+HEADER_FORMAT = {'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#4472C4',
+                 'align': 'center', 'valign': 'vcenter', 'text_wrap': True, 'border': 1}
+GRAY_FORMAT = {'bold': True, 'bg_color': '#D3D3D3',
+               'align': 'left', 'valign': 'vcenter', 'text_wrap': True, 'border': 1}
+DATA_FORMAT = {'border': 1}
+DATA_LEFT_FORMAT = {'align': 'left', 'valign': 'vcenter', 'text_wrap': True, 'border': 1}
+DATA_CENTER_FORMAT = {'align': 'center', 'valign': 'vcenter', 'text_wrap': True, 'border': 1}
+# Ширина столбцов A-E
+COLUMN_WIDTHS = (30, 70, 15, 15, 25)
+
+
+@lru_cache(maxsize=256)
 def calculate_pipe_mass_per_meter(diameter, wall_thickness):
     """
     Расчет массы трубы за 1 метр по ГОСТ 18599-2001
+    Результат кэшируется: в спецификациях повторяется небольшой набор типоразмеров
     
     Формула: m = π * (D - e) * e * ρ / 1000
     где:
@@ -28,24 +70,22 @@ def calculate_pipe_mass_per_meter(diameter, wall_thickness):
     ρ - плотность материала (г/см³)
     π - 3.14159
     """
-    # Формула массы трубы
+    # Формула массы трубы. Расчет скалярный с кэшем: типоразмеров единицы,
+    # а векторизация через NumPy на таких объемах медленнее из-за создания массивов
     mass = math.pi * (diameter - wall_thickness) * wall_thickness * PE_DENSITY / 1000
     return round(mass, 2)
 
 
+@lru_cache(maxsize=4096)
 def extract_pipe_parameters(nomenclature):
     """
     Извлечение параметров трубы из номенклатуры
     Формат: "Труба ... SDR17 - 160 х9,50" или "Труба ... ∅160х23,7"
+    Результат кэшируется: одна и та же номенклатура повторяется в файлах
     
     Возвращает: (диаметр, толщина стенки) или None
     """
-    # Паттерн 1: SDR формат (160 х9,50)
-    pattern1 = r'(\d+)\s*[хx×]\s*(\d+[,.]?\d*)'
-    # Паттерн 2: ∅ формат (∅160х23,7)
-    pattern2 = r'[∅Ø](\d+)[хx×](\d+[,.]?\d*)'
-    
-    match = re.search(pattern1, nomenclature) or re.search(pattern2, nomenclature)
+    match = _PIPE_PARAMS_RE.search(nomenclature)
     
     if match:
         diameter = int(match.group(1))
@@ -55,56 +95,70 @@ def extract_pipe_parameters(nomenclature):
     return None
 
 
-def is_pipe(nomenclature):
-    """Проверка, является ли номенклатура трубой"""
-    if not nomenclature or pd.isna(nomenclature):
-        return False
-    nomenclature_lower = str(nomenclature).lower()
-    return 'труба' in nomenclature_lower or 'футляр' in nomenclature_lower
+@lru_cache(maxsize=4096)
+def classify_nomenclature(nomenclature):
+    """
+    Классификация номенклатуры за один проход регулярного выражения
+    
+    Возвращает: (труба или фитинг, труба)
+    """
+    match = _PIPE_OR_FITTING_RE.search(nomenclature)
+    if match is None:
+        return False, False
+    if match.group(1) is not None:
+        return True, True
+    # Первым найден фитинг, упоминание трубы может быть дальше в строке
+    return True, _PIPE_RE.search(nomenclature, match.end()) is not None
 
 
-def is_pipe_or_fitting(nomenclature):
-    """Проверка, является ли номенклатура трубой или фитингом"""
-    if not nomenclature or pd.isna(nomenclature):
-        return False
-    
-    nomenclature_lower = str(nomenclature).lower()
+def find_header_columns(header_row):
+    """
+    Определение индексов столбцов по строке заголовка таблицы
     
-    # Трубы
-    if 'труба' in nomenclature_lower or 'футляр' in nomenclature_lower:
-        return True
+    Возвращает словарь {'name' | 'qty' | 'unit_qty' | 'manufacturer': индекс столбца}
+    """
+    columns = {}
     
-    # Фитинги (только указанные)
-    fittings = ['муфта', 'отвод', 'втулка', 'фланец']
+    for col_idx, header in enumerate(header_row):
+        if not header:
+            continue
+        header_norm = str(header).translate(_HEADER_STRIP_TABLE).lower()
+        
+        for substrings, tag in _HEADER_TAGS:
+            if all(s in header_norm for s in substrings):
+                # Проверяем, не объединен ли столбец с единицей измерения
+                if tag == 'qty' and any(m in header_norm for m in _UNIT_MARKERS):
+                    tag = 'unit_qty'
+                columns[tag] = col_idx
+                break
     
-    return any(fitting in nomenclature_lower for fitting in fittings)
+    return columns
 
 
 def parse_pdf_file(pdf_path):
     """
     Парсинг одного PDF файла и извлечение данных
     
-    Возвращает список словарей с данными:
-    [{
+    Генератор: строки отдаются по мере чтения таблиц в виде словарей
+    {
         'Файл': 'имя файла',
         'Номенклатура': '...',
         'Количество': ...,
         'Масса': ...,
         'Завод изготовитель': '...'
-    }, ...]
+    }
     """
     filename = os.path.basename(pdf_path)
     # Убираем расширение .pdf из имени файла
-    filename_without_ext = filename.replace('.pdf', '')
-    data = []
-    
-    print(f"\n📄 Обрабатываю: {filename}")
+    filename_without_ext = os.path.splitext(filename)[0]
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # Извлекаем таблицы со страницы
-                tables = page.extract_tables()
+        with pymupdf.open(pdf_path) as doc:
+            for page_num, page in enumerate(doc, 1):
+                # Извлекаем таблицы со страницы. Границы ячеек берутся только из
+                # векторных линий ("lines_strict"): заливки фона не дробят ячейки,
+                # и значения, перетекающие в соседний столбец, не разрываются
+                tables = [t.extract() for t in page.find_tables(strategy="lines_strict").tables]
                 
                 if not tables:
                     continue
@@ -117,8 +171,10 @@ def parse_pdf_file(pdf_path):
                     header_row = None
                     header_idx = -1
                     
+                    # Ячейки приходят строками или None, str() не нужен;
+                    # any() останавливается на первой подходящей ячейке
                     for idx, row in enumerate(table[:5]):  # Проверяем первые 5 строк
-                        if row and any('Наименование' in str(cell) for cell in row if cell):
+                        if row and any(cell and 'Наименование' in cell for cell in row):
                             header_row = row
                             header_idx = idx
                             break
@@ -127,31 +183,21 @@ def parse_pdf_file(pdf_path):
                         continue
                     
                     # Определяем индексы нужных столбцов
-                    name_col = None
-                    qty_col = None
-                    unit_qty_col = None  # Столбец где единица и количество вместе
-                    manufacturer_col = None
+                    columns = find_header_columns(header_row)
+                    name_col = columns.get('name')
+                    qty_col = columns.get('qty')
+                    unit_qty_col = columns.get('unit_qty')  # Столбец где единица и количество вместе
+                    manufacturer_col = columns.get('manufacturer')
                     
-                    for col_idx, header in enumerate(header_row):
-                        if not header:
-                            continue
-                        header_str = str(header).strip().replace('\n', '').replace(' ', '').replace('-', '')
-                        
-                        if 'Наименование' in str(header) and 'техническ' in str(header).lower():
-                            name_col = col_idx
-                        elif 'коли' in header_str.lower() or 'количество' in header_str.lower() or ('оли' in header_str.lower() and 'ство' in header_str.lower()):
-                            # Проверяем, не объединен ли столбец с единицей измерения
-                            if 'единиц' in header_str.lower() or 'измер' in header_str.lower():
-                                unit_qty_col = col_idx
-                            else:
-                                qty_col = col_idx
-                        elif 'Завод' in str(header) or 'изготовитель' in str(header).lower():
-                            manufacturer_col = col_idx
+                    # Минимальная длина строки, при которой доступны все найденные столбцы
+                    cols_to_check = [c for c in (name_col, qty_col, unit_qty_col, manufacturer_col) if c is not None]
+                    if not cols_to_check:
+                        continue
+                    min_len = max(cols_to_check) + 1
                     
                     # Извлекаем данные из строк таблицы
                     for row in table[header_idx + 1:]:
-                        cols_to_check = [c for c in [name_col, qty_col, unit_qty_col, manufacturer_col] if c is not None]
-                        if not row or not cols_to_check or len(row) <= max(cols_to_check):
+                        if not row or len(row) < min_len:
                             continue
                         
                         nomenclature = row[name_col] if name_col is not None else ''
@@ -178,56 +224,63 @@ def parse_pdf_file(pdf_path):
                         
                         manufacturer = row[manufacturer_col] if manufacturer_col is not None else ''
                         
-                        # Пропускаем пустые строки
-                        if not nomenclature or str(nomenclature).strip() == '':
+                        # Очистка данных, пропускаем пустые строки
+                        nomenclature = str(nomenclature).strip() if nomenclature else ''
+                        if not nomenclature:
                             continue
                         
-                        # Очистка данных
-                        nomenclature = str(nomenclature).strip()
-                        
                         # Фильтр: оставляем только трубы и фитинги
-                        if not is_pipe_or_fitting(nomenclature):
+                        pipe_or_fitting, pipe = classify_nomenclature(nomenclature)
+                        if not pipe_or_fitting:
                             continue
                         
-                        # Парсинг количества
-                        try:
-                            if quantity and str(quantity).strip():
-                                quantity_str = str(quantity).strip().replace(',', '.').replace(' ', '')
-                                # Извлекаем число из строки
-                                qty_match = re.search(r'(\d+[.,]?\d*)', quantity_str)
-                                if qty_match:
-                                    quantity = float(qty_match.group(1).replace(',', '.'))
-                                else:
-                                    quantity = None
-                            else:
-                                quantity = None
-                        except:
-                            quantity = None
+                        # Парсинг количества: запятые уже заменены на точки,
+                        # поэтому найденное число всегда разбирается float()
+                        quantity_str = str(quantity).strip().replace(',', '.').replace(' ', '') if quantity else ''
+                        # Извлекаем число из строки
+                        qty_match = _QTY_RE.search(quantity_str)
+                        quantity = float(qty_match.group(1)) if qty_match else None
                         
                         # Очистка производителя
                         manufacturer = str(manufacturer).strip() if manufacturer else ''
                         
                         # Расчет массы для труб
                         mass = None
-                        if is_pipe(nomenclature):
+                        if pipe:
                             params = extract_pipe_parameters(nomenclature)
                             if params:
                                 diameter, thickness = params
                                 mass = calculate_pipe_mass_per_meter(diameter, thickness)
                         
-                        data.append({
+                        yield {
                             'Файл': filename_without_ext,
                             'Номенклатура': nomenclature,
                             'Количество': quantity,
                             'Масса': mass,
                             'Завод изготовитель': manufacturer
-                        })
+                        }
     
     except Exception as e:
-        print(f"   ⚠️  Ошибка при обработке {filename}: {e}")
-    
-    print(f"   ✓ Извлечено строк: {len(data)}")
-    return data
+        logger.warning(f"   ⚠️  Ошибка при обработке {filename}: {e}")
+
+
+def parse_pdf_file_rows(pdf_path):
+    """
+    Список строк одного PDF файла (для обработки в отдельном процессе,
+    генератор между процессами не передается)
+    """
+    return list(parse_pdf_file(pdf_path))
+
+
+def iter_rows_with_progress(pdf_paths, results):
+    """
+    Строки всех файлов подряд с одной строкой статистики на файл.
+    Статистика пишется в основном процессе: рабочие процессы только
+    возвращают строки и не пишут в stdout
+    """
+    for pdf_path, rows in zip(pdf_paths, results):
+        logger.info(f"   ✓ {os.path.basename(pdf_path)}: извлечено строк: {len(rows)}")
+        yield from rows
 
 
 def create_excel_with_formatting(data, output_file):
@@ -235,139 +288,109 @@ def create_excel_with_formatting(data, output_file):
     Создание Excel файла с форматированием
     - Серые строки для разделения файлов
     - Выравнивание и границы
+    
+    data - любой итерируемый источник строк, в том числе генератор.
+    Файл пишется xlsxwriter в режиме constant_memory: каждая строка
+    сразу уходит во временный файл, дерево ячеек в памяти не строится
+    
+    Возвращает количество записанных строк
     """
-    if not data:
-        print("⚠️  Нет данных для записи")
-        return
+    # Проверяем наличие данных до создания файла
+    rows = iter(data)
+    first_row = next(rows, None)
+    if first_row is None:
+        logger.warning("⚠️  Нет данных для записи")
+        return 0
     
-    # Создаем DataFrame
-    df = pd.DataFrame(data)
+    # Создаем Excel workbook в потоковом режиме
+    wb = xlsxwriter.Workbook(output_file, {'constant_memory': True})
+    ws = wb.add_worksheet("Спецификация")
     
-    # Создаем Excel workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Спецификация"
+    header_format = wb.add_format(HEADER_FORMAT)
+    gray_format = wb.add_format(GRAY_FORMAT)
+    data_format = wb.add_format(DATA_FORMAT)
+    data_left_format = wb.add_format(DATA_LEFT_FORMAT)
+    data_center_format = wb.add_format(DATA_CENTER_FORMAT)
     
-    # Стили
-    gray_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    bold_font = Font(bold=True)
-    center_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    left_align = Alignment(horizontal="left", vertical="center", wrap_text=True)
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    # Настройка ширины столбцов и закрепление первой строки
+    for col_idx, width in enumerate(COLUMN_WIDTHS):
+        ws.set_column(col_idx, col_idx, width)
+    ws.freeze_panes(1, 0)
     
     # Заголовки
     headers = ['Файл', 'Номенклатура', 'Количество', 'Масса', 'Завод изготовитель']
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = center_align
-        cell.border = thin_border
+    ws.write_row(0, 0, headers, header_format)
     
-    # Данные
+    # Данные (строки нумеруются с 0, строка 0 - заголовок)
     current_file = None
-    row_idx = 2
+    row_idx = 1
+    rows_count = 0
     
-    for idx, row in df.iterrows():
+    # Строки уже сгруппированы по файлам в порядке обработки
+    for row in chain((first_row,), rows):
         # Если новый файл - добавляем строку-разделитель
         if row['Файл'] != current_file:
             current_file = row['Файл']
             
             # Строка с названием файла (серый фон)
-            if row_idx > 2:  # Не добавляем пустую строку перед первым файлом
+            if row_idx > 1:  # Не добавляем пустую строку перед первым файлом
                 row_idx += 1
             
-            file_cell = ws.cell(row=row_idx, column=1, value=current_file)
-            file_cell.fill = gray_fill
-            file_cell.font = bold_font
-            file_cell.alignment = left_align
-            file_cell.border = thin_border
-            
             # Объединяем ячейки для названия файла
-            ws.merge_cells(start_row=row_idx, start_column=1, end_row=row_idx, end_column=5)
-            
-            # Применяем стили ко всем ячейкам объединенной строки
-            for col in range(1, 6):
-                cell = ws.cell(row=row_idx, column=col)
-                cell.fill = gray_fill
-                cell.border = thin_border
+            ws.merge_range(row_idx, 0, row_idx, 4, current_file, gray_format)
             
             row_idx += 1
         
         # Данные строки
-        ws.cell(row=row_idx, column=1, value='').border = thin_border
-        ws.cell(row=row_idx, column=2, value=row['Номенклатура']).border = thin_border
-        ws.cell(row=row_idx, column=2).alignment = left_align
-        
-        qty_cell = ws.cell(row=row_idx, column=3, value=row['Количество'] if pd.notna(row['Количество']) else '')
-        qty_cell.border = thin_border
-        qty_cell.alignment = center_align
-        
-        mass_cell = ws.cell(row=row_idx, column=4, value=row['Масса'] if pd.notna(row['Масса']) else '')
-        mass_cell.border = thin_border
-        mass_cell.alignment = center_align
-        
-        manuf_cell = ws.cell(row=row_idx, column=5, value=row['Завод изготовитель'])
-        manuf_cell.border = thin_border
-        manuf_cell.alignment = center_align
+        quantity = row['Количество']
+        mass = row['Масса']
+        ws.write_blank(row_idx, 0, None, data_format)
+        ws.write(row_idx, 1, row['Номенклатура'], data_left_format)
+        ws.write(row_idx, 2, quantity if quantity is not None else '', data_center_format)
+        ws.write(row_idx, 3, mass if mass is not None else '', data_center_format)
+        ws.write(row_idx, 4, row['Завод изготовитель'], data_center_format)
         
         row_idx += 1
-    
-    # Настройка ширины столбцов
-    ws.column_dimensions['A'].width = 30
-    ws.column_dimensions['B'].width = 70
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 15
-    ws.column_dimensions['E'].width = 25
-    
-    # Закрепление первой строки
-    ws.freeze_panes = 'A2'
+        rows_count += 1
     
     # Сохранение
-    wb.save(output_file)
-    print(f"\n✅ Excel файл сохранен: {output_file}")
-    print(f"   Всего строк: {len(df)}")
+    wb.close()
+    logger.info(f"\n✅ Excel файл сохранен: {output_file}")
+    logger.info(f"   Всего строк: {rows_count}")
+    return rows_count
 
 
 def main():
     """Основная функция"""
-    print("=" * 80)
-    print("🚀 ПАРСИНГ PDF СПЕЦИФИКАЦИЙ")
-    print("=" * 80)
+    # Весь вывод идет через один обработчик в stdout
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    
+    logger.info("=" * 80)
+    logger.info("🚀 ПАРСИНГ PDF СПЕЦИФИКАЦИЙ")
+    logger.info("=" * 80)
     
     # Путь к папке с PDF
     pdf_folder = '/Users/exmuzzy2/git/fedor/pdf'
     
-    # Получаем список всех PDF файлов
-    pdf_files = [f for f in os.listdir(pdf_folder) if f.endswith('.pdf')]
-    pdf_files.sort()  # Сортируем по имени
-    
-    print(f"\n📁 Найдено PDF файлов: {len(pdf_files)}")
-    
-    # Парсим все файлы
-    all_data = []
+    # Получаем список всех PDF файлов (полные пути, отсортированы по имени)
+    with os.scandir(pdf_folder) as entries:
+        pdf_files = sorted(e.path for e in entries if e.is_file() and e.name.lower().endswith('.pdf'))
     
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(pdf_folder, pdf_file)
-        file_data = parse_pdf_file(pdf_path)
-        all_data.extend(file_data)
+    logger.info(f"\n📁 Найдено PDF файлов: {len(pdf_files)}")
     
-    print(f"\n📊 Всего извлечено записей: {len(all_data)}")
-    
-    # Создаем Excel
+    # Парсим все файлы параллельно: каждый PDF обрабатывается в отдельном процессе.
+    # executor.map сохраняет порядок файлов, и строки каждого файла сразу уходят
+    # в Excel, не накапливаясь в общем списке
     output_file = '/Users/exmuzzy2/git/fedor/specifications_full.xlsx'
-    create_excel_with_formatting(all_data, output_file)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(parse_pdf_file_rows, pdf_files, chunksize=1)
+        total_rows = create_excel_with_formatting(iter_rows_with_progress(pdf_files, results), output_file)
+    
+    logger.info(f"\n📊 Всего извлечено записей: {total_rows}")
     
-    print("\n" + "=" * 80)
-    print("✅ ГОТОВО!")
-    print("=" * 80)
+    logger.info("\n" + "=" * 80)
+    logger.info("✅ ГОТОВО!")
+    logger.info("=" * 80)
 
 
 if __name__ == '__main__':